@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The notebooks import the helper modules as utils.<module> from the content directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
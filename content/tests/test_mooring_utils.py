@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from utils.mooring_utils import align_uls_to_dates, read_uls_draft, read_uls_means
+
+# read_csv(header=2) in the notebook uses the third line as the (replaced) header, so the raw files have three header lines
+ULS_HEADER = "BGEP mooring A\nice draft\ndate time draft\n"
+
+
+def write_uls_file(data_dir, rows, letter="a"):
+    with open(data_dir / ("uls18"+letter+"_draft.dat"), "w") as f:
+        f.write(ULS_HEADER + "".join(" ".join(row)+"\n" for row in rows))
+
+
+def notebook_means(data_dir, letter="a"):
+    """ Daily and monthly means as computed by the original notebook get_uls """
+    uls = pd.read_csv(str(data_dir)+'/uls18'+letter+'_draft.dat', sep=r'\s+', names=['date', 'time', 'draft'], header=2)
+    utc_datetime_uls = pd.to_datetime(uls['date'], format='%Y%m%d')
+    daily = uls['draft'].groupby([utc_datetime_uls.dt.date]).mean()
+    monthly = uls['draft'].groupby([utc_datetime_uls.dt.to_period('M')]).mean()
+    return daily, monthly
+
+
+ROWS = [("20181101", "000002", "0.51"), ("20181101", "120002", "0.73"), ("20181102", "000002", "0.90"),
+        ("20181215", "060002", "1.20"), ("20181231", "235958", "1.42")]
+
+
+def test_means_match_notebook(tmp_path):
+    write_uls_file(tmp_path, ROWS)
+    daily, monthly, lon, lat = read_uls_means("a", data_path=str(tmp_path))
+    nb_daily, nb_monthly = notebook_means(tmp_path)
+
+    np.testing.assert_allclose(daily.values, nb_daily.values)
+    np.testing.assert_array_equal(daily.index.date, nb_daily.index.values)
+    np.testing.assert_allclose(monthly.values, nb_monthly.values)
+    np.testing.assert_array_equal(monthly.index.to_period("M"), nb_monthly.index)
+    assert (lon, lat) == (-150., 75.)
+
+    # Sample times are kept in the cache
+    uls = read_uls_draft("a", data_path=str(tmp_path))
+    assert uls.index[1] == pd.Timestamp("2018-11-01 12:00:02")
+
+
+def test_second_read_uses_cache(tmp_path, capsys):
+    write_uls_file(tmp_path, ROWS)
+    read_uls_draft("a", data_path=str(tmp_path))
+    assert "Parsing ULS file" in capsys.readouterr().out
+    uls = read_uls_draft("a", data_path=str(tmp_path))
+    assert "Parsing ULS file" not in capsys.readouterr().out
+    assert len(uls) == len(ROWS)
+
+
+def test_unrecognized_time_format_falls_back_to_date(tmp_path):
+    write_uls_file(tmp_path, [("20181101", "0", "0.5"), ("20181101", "12", "0.7"), ("20181102", "1", "0.9")])
+    uls = read_uls_draft("a", data_path=str(tmp_path))
+    assert list(uls.index) == list(pd.to_datetime(["2018-11-01", "2018-11-01", "2018-11-02"]))
+
+
+def test_align_to_dates(tmp_path):
+    write_uls_file(tmp_path, ROWS)
+    daily, monthly, lon, lat = read_uls_means("a", data_path=str(tmp_path))
+    dates = pd.date_range("Nov 2018", "Jan 2019", freq="MS")
+    aligned = align_uls_to_dates(monthly, dates)
+    np.testing.assert_allclose(aligned.values[:2], monthly.values)
+    assert np.isnan(aligned.values[2])
+    assert (aligned.index == dates).all()
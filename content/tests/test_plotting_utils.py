@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+
+CONTENT_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+
+def test_headless_import_skips_plotting_stack():
+    # Run in a fresh interpreter so modules imported by other tests don't count
+    code = ("import sys; import utils.analysis_utils, utils.plotting_utils; "
+            "print(sorted(m for m in ['matplotlib', 'cartopy', 'holoviews', 'hvplot'] if m in sys.modules))")
+    env = dict(os.environ, IS2BOOK_HEADLESS="1")
+    result = subprocess.run([sys.executable, "-c", code], cwd=CONTENT_DIR, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,101 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from utils import read_data_utils
+from utils.read_data_utils import build_IS2SITMOGR4_reference_index, read_IS2SITMOGR4, read_book_data
+
+
+def write_monthly_files(data_dir, months):
+    """ Write tiny IS2SITMOGR4-like monthly netcdf files (no time dimension, like the real files) """
+    x = np.arange(3)*25000.
+    y = np.arange(2)*25000.
+    for i, month in enumerate(months):
+        ds = xr.Dataset({"ice_thickness": (("y", "x"), np.full((2, 3), float(i)) + np.arange(6).reshape(2, 3)/10.),
+                         "latitude": (("y", "x"), 80. + np.arange(6).reshape(2, 3)),
+                         "longitude": (("y", "x"), -150. + np.arange(6).reshape(2, 3))},
+                        coords={"x": x, "y": y})
+        ds.to_netcdf(data_dir / ("IS2SITMOGR4_01_"+month+"_006_001.nc"), engine="netcdf4")
+
+
+@pytest.mark.parametrize("index_name", ["refs.json", "refs.parquet"])
+def test_reference_index_matches_netcdf(tmp_path, index_name):
+    data_dir = tmp_path / "V3"
+    data_dir.mkdir()
+    # Written out of order to check the time sorting
+    write_monthly_files(data_dir, ["201812", "201811", "201901"])
+
+    out_file = build_IS2SITMOGR4_reference_index(netcdf_path=str(data_dir), out_file=str(tmp_path / index_name), storage_options={})
+    ref_ds = read_IS2SITMOGR4(data_type="reference", reference_path=out_file, storage_options={}, persist=False, cache=False)
+    nc_ds = read_IS2SITMOGR4(data_type="netcdf-local", local_data_path=str(tmp_path)+"/", persist=False, cache=False)
+
+    np.testing.assert_array_equal(ref_ds.time.values, pd.to_datetime(["2018-11-01", "2018-12-01", "2019-01-01"]).values)
+    np.testing.assert_array_equal(ref_ds.time.values, nc_ds.time.values)
+    np.testing.assert_allclose(ref_ds.ice_thickness.values, nc_ds.ice_thickness.values)
+    np.testing.assert_allclose(ref_ds.latitude.values, nc_ds.latitude.values)
+
+
+@pytest.fixture
+def book_dir(tmp_path, monkeypatch):
+    """ Working directory with tiny IS2 and IS2/CS2 book data files, read_book_data reads from os.getcwd()+local_path """
+    (tmp_path / "data").mkdir()
+    for i, filename in enumerate(["IS2_jbook_dataset_201811-202104.nc", "IS2_CS2_jbook_dataset_201811-202104.nc"]):
+        ds = xr.Dataset({"ice_thickness": (("y", "x"), np.full((10, 10), float(i)))},
+                        coords={"x": np.arange(10)*25000., "y": np.arange(10)*25000.})
+        ds.to_netcdf(tmp_path / "data" / filename)
+    monkeypatch.chdir(tmp_path)
+    read_data_utils.clear_dataset_cache()
+    yield tmp_path
+    read_data_utils.clear_dataset_cache()
+
+
+def test_cache_second_call_hits_memory(book_dir, capsys):
+    read_book_data()
+    book_ds = read_book_data()
+    assert "Using dataset cached in memory" in capsys.readouterr().out
+    assert float(book_ds.ice_thickness.mean()) == 0.
+    assert len(read_data_utils._dataset_cache) == 1
+
+
+def test_cache_source_change_reopens(book_dir, capsys):
+    read_book_data()
+    mtime = os.path.getmtime(book_dir / "data" / "IS2_jbook_dataset_201811-202104.nc")
+    os.utime(book_dir / "data" / "IS2_jbook_dataset_201811-202104.nc", (mtime+10, mtime+10))
+    capsys.readouterr()
+    read_book_data()
+    assert "Using dataset cached in memory" not in capsys.readouterr().out
+    # The entry for the old version of the file is replaced
+    assert len(read_data_utils._dataset_cache) == 1
+
+
+def test_cache_evicts_least_recently_used(book_dir, monkeypatch):
+    monkeypatch.setattr(read_data_utils, "dataset_cache_max_bytes", 1)
+    read_book_data()
+    read_book_data(CS2=True)
+    assert len(read_data_utils._dataset_cache) == 1
+    ds, persisted = list(read_data_utils._dataset_cache.values())[0]
+    assert float(ds.ice_thickness.mean()) == 1.
+
+
+def test_cache_dir_copy(book_dir, capsys):
+    cache_dir = str(book_dir / "cache")
+    # A local copy is written even if the dataset is already cached in memory
+    read_book_data()
+    read_book_data(cache_dir=cache_dir)
+    assert len(glob.glob(cache_dir+"/book_data_*.zarr")) == 1
+
+    read_data_utils.clear_dataset_cache()
+    capsys.readouterr()
+    book_ds = read_book_data(cache_dir=cache_dir)
+    assert "Using dataset cached on disk" in capsys.readouterr().out
+    assert float(book_ds.ice_thickness.mean()) == 0.
+
+    # A change to the source replaces the out of date copy
+    mtime = os.path.getmtime(book_dir / "data" / "IS2_jbook_dataset_201811-202104.nc")
+    os.utime(book_dir / "data" / "IS2_jbook_dataset_201811-202104.nc", (mtime+10, mtime+10))
+    read_book_data(cache_dir=cache_dir)
+    assert len(glob.glob(cache_dir+"/book_data_*.zarr")) == 1
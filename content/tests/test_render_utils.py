@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from utils.render_utils import render_figures
+
+SPEC = {"name": "winter_lineplot", "function": "static_winter_comparison_lineplot", "variable": "ice_thickness",
+        "options": {"years": ["2018"], "start_month": "Nov"}}
+
+
+def winter_dataset():
+    time = pd.date_range("Nov 2018", "Apr 2019", freq="MS")
+    ice_thickness = xr.DataArray(np.arange(len(time)*4, dtype=float).reshape(len(time), 2, 2), dims=("time", "y", "x"),
+                                 coords={"time": time}, attrs={"long_name": "Sea ice thickness", "units": "m"})
+    return xr.Dataset({"ice_thickness": ice_thickness})
+
+
+def test_render_skips_unchanged_figures(tmp_path):
+    ds = winter_dataset()
+    manifest = render_figures(ds, [SPEC], out_dir=str(tmp_path), max_workers=1)
+    assert manifest["winter_lineplot"]["status"] == "rendered"
+    assert os.path.isfile(tmp_path / "winter_lineplot.png")
+    assert os.path.isfile(tmp_path / "render_manifest.json")
+    first_hash = manifest["winter_lineplot"]["hash"]
+
+    manifest = render_figures(ds, [SPEC], out_dir=str(tmp_path), max_workers=1)
+    assert manifest["winter_lineplot"]["status"] == "skipped"
+
+    # Changing one value re-renders the figure
+    ds["ice_thickness"][0, 0, 0] = 10.
+    manifest = render_figures(ds, [SPEC], out_dir=str(tmp_path), max_workers=1)
+    assert manifest["winter_lineplot"]["status"] == "rendered"
+    assert manifest["winter_lineplot"]["hash"] != first_hash
+
+
+def test_render_failure_is_recorded(tmp_path):
+    spec = dict(SPEC, name="bad_figure", function="notAPlottingFunction")
+    manifest = render_figures(winter_dataset(), [SPEC, spec], out_dir=str(tmp_path), max_workers=1)
+    assert manifest["winter_lineplot"]["status"] == "rendered"
+    assert manifest["bad_figure"]["status"] == "failed"
+    assert "hash" not in manifest["bad_figure"]
@@ -0,0 +1 @@
+""" Helper modules used by the notebooks (import as e.g. utils.read_data_utils from the content directory) """
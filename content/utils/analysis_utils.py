@@ -0,0 +1,85 @@
+# +
+""" analysis_utils.py 
+
+Helper functions for computing seasonal data and means. 
+These only need xarray/numpy/pandas, so they can be used in headless processing jobs without the plotting stack in plotting_utils. 
+
+"""
+
+import xarray as xr
+import numpy as np 
+import pandas as pd
+
+
+# -
+
+def get_winter_data(da, year_start=None, start_month="Sep", end_month="Apr", force_complete_season=False):
+    """ Select data for winter seasons corresponding to the input time range 
+    
+    Args: 
+        da (xr.Dataset or xr.DataArray): data to restrict by time; must contain "time" as a coordinate 
+        year_start (str, optional): year to start time range; if you want Sep 2019 - Apr 2020, set year="2019" (default to the first year in the dataset)
+        start_month (str, optional): first month in winter (default to September)
+        end_month (str, optional): second month in winter; this is the following calender year after start_month (default to April)
+        force_complete_season (bool, optional): require that winter season returns data if and only if all months have data? i.e. if Sep and Oct have no data, return nothing even if Nov-Apr have data? (default to False) 
+        
+    Returns: 
+        da_winter (xr.Dataset or xr.DataArray): da restricted to winter seasons 
+    
+    """
+    if year_start is None: 
+        print("No start year specified. Getting winter data for first year in the dataset")
+        year_start = str(pd.to_datetime(da.time.values[0]).year)
+    
+    start_timestep = start_month+" "+str(year_start) # mon year 
+    end_timestep = end_month+" "+str(int(year_start)+1) # mon year
+    winter = pd.date_range(start=start_timestep, end=end_timestep, freq="MS") # pandas date range defining winter season
+    months_in_da = [mon for mon in winter if mon in da.time.values] # Just grab months if they correspond to a time coordinate in da
+
+    if len(months_in_da) > 0: 
+        if (force_complete_season == True) and (all([mon in da.time.values for mon in winter])==False): 
+            da_winter = None
+        else: 
+            da_winter = da.sel(time=months_in_da)
+    else: 
+        da_winter = None
+        
+    return da_winter
+
+
+def compute_gridcell_winter_means(da, years=None, start_month="Nov", end_month="Apr", force_complete_season=False): 
+    """ Compute winter means over the time dimension. Useful for plotting as the grid is maintained. 
+    
+    Args: 
+        da (xr.Dataset or xr.DataArray): data to restrict by time; must contain "time" as a coordinate 
+        years (list of str): years over which to compute mean (default to unique years in the dataset)
+        year_start (str, optional): year to start time range; if you want Nov 2019 - Apr 2020, set year="2019" (default to the first year in the dataset)
+        start_month (str, optional): first month in winter (default to November)
+        end_month (str, optional): second month in winter; this is the following calender year after start_month (default to April)
+        force_complete_season (bool, optional): require that winter season returns data if and only if all months have data? i.e. if Sep and Oct have no data, return nothing even if Nov-Apr have data? (default to False) 
+    
+    Returns: 
+        merged (xr.DataArray): DataArray with winter means as a time coordinate
+    """
+    
+    if years is None: 
+        years = np.unique(pd.to_datetime(da.time.values).strftime("%Y")) # Unique years in the dataset 
+
+    winter_means = []
+    for year in years: # Loop through each year and grab the winter months, compute winter mean, and append to list 
+        da_winter_i = get_winter_data(da, year_start=year, start_month=start_month, end_month=end_month, force_complete_season=force_complete_season)
+        if da_winter_i is None: 
+            continue
+        da_mean_i = da_winter_i.mean(dim="time", keep_attrs=True) # Comput mean over time dimension
+
+        # Assign time coordinate 
+        time_arr = pd.to_datetime(da_winter_i.time.values)
+        da_mean_i = da_mean_i.assign_coords({"time":time_arr[0].strftime("%b %Y")+" - "+time_arr[-1].strftime("%b %Y")})
+        da_mean_i = da_mean_i.expand_dims("time")
+
+        winter_means.append(da_mean_i)
+
+    merged = xr.merge(winter_means) # Combine each winter mean Dataset into a single Dataset, with the time period maintained as a coordinate
+    merged = merged[list(merged.data_vars)[0]] # Convert to DataArray
+    merged.time.attrs["description"] = "Time period over which mean was computed" # Add descriptive attribute 
+    return merged 
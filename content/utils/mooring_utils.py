@@ -0,0 +1,136 @@
+# +
+""" mooring_utils.py
+
+Helper functions for reading the BGEP upward looking sonar (ULS) mooring ice draft data and lining it up with the ICESat-2 monthly data
+
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# Mooring locations (lon, lat)
+ULS_LOCATIONS = {'a': (-150., 75.), 'b': (-150., 78.4), 'd': (-140., 74.)}
+
+# -
+
+def _parse_uls_times(date, time):
+    """ Sample datetimes from the ULS date (YYYYMMDD) and time columns. Time can be HH:MM:SS or HHMMSS (with optional fractional seconds),
+    anything else falls back to the date alone as that is all the daily/monthly means need """
+    dates = pd.to_datetime(date, format='%Y%m%d')
+    if time.str.contains(':').all():
+        offsets = pd.to_timedelta(time, errors='coerce')
+    elif time.str.split('.').str[0].str.len().isin([5, 6]).all(): # HHMMSS, possibly without the leading zero
+        hhmmss = pd.to_numeric(time, errors='coerce')
+        offsets = pd.to_timedelta(hhmmss//10000, unit='h') + pd.to_timedelta((hhmmss//100)%100, unit='m') + pd.to_timedelta(hhmmss%100, unit='s')
+    else:
+        offsets = None
+
+    if (offsets is None) or offsets.isna().any() or (offsets >= pd.Timedelta(days=1)).any():
+        print('Unrecognized ULS time format, indexing samples by date only')
+        return pd.DatetimeIndex(dates)
+    return pd.DatetimeIndex(dates + offsets)
+
+
+def read_uls_draft(letter, data_path='./data/', cache_path=None, year_str='18'):
+    """ Read in the high-frequency ULS ice draft data for a BGEP mooring.
+    The raw whitespace delimited .dat file is only parsed the first time, after which a typed parquet copy
+    (sample datetime index, float64 draft) is read in instead. The cache is regenerated if the .dat file is newer.
+
+    Args:
+        letter (str, required): mooring letter ("a", "b" or "d")
+        data_path (str, optional): directory containing the uls{year_str}{letter}_draft.dat files (default to "./data/")
+        cache_path (str, optional): directory for the parquet cache (default to data_path)
+        year_str (str, optional): deployment year string used in the filename (default to "18")
+
+    Returns:
+        uls (pd.Series): ice draft (m), indexed by datetime
+
+    """
+    if letter not in ULS_LOCATIONS:
+        raise ValueError("Mooring must be one of "+", ".join(ULS_LOCATIONS.keys()))
+    if cache_path is None:
+        cache_path = data_path
+
+    filename = os.path.join(data_path, 'uls'+year_str+letter+'_draft.dat')
+    cache_file = os.path.join(cache_path, 'uls'+year_str+letter+'_draft.parquet')
+
+    # Use the cache unless the raw file has since been updated (or the cache is all we have)
+    if os.path.isfile(cache_file) and ((not os.path.isfile(filename)) or (os.path.getmtime(cache_file) >= os.path.getmtime(filename))):
+        uls = pd.read_parquet(cache_file)
+        return uls['draft']
+
+    print('Parsing ULS file (cached to parquet after the first read):', filename)
+    uls = pd.read_csv(filename, sep=r'\s+', names=['date', 'time', 'draft'], header=2,
+                      dtype={'date': str, 'time': str, 'draft': np.float64})
+    # Keep the full sample time so the cache holds everything in the raw file
+    uls.index = _parse_uls_times(uls['date'], uls['time'])
+    uls.index.name = 'datetime'
+    uls = uls[['draft']]
+
+    os.makedirs(cache_path, exist_ok=True)
+    uls.to_parquet(cache_file)
+
+    return uls['draft']
+
+
+def compute_uls_means(uls):
+    """ Compute daily and monthly mean ULS ice draft
+
+    Args:
+        uls (pd.Series): ice draft indexed by datetime, e.g. from read_uls_draft
+
+    Returns:
+        uls_mean_daily_draft (pd.Series): daily mean draft, indexed by day
+        uls_mean_monthly_draft (pd.Series): monthly mean draft, indexed by the first day of the month
+
+    """
+    # Drop the empty days/months resample adds in any data gaps to match the previous groupby means
+    uls_mean_daily_draft = uls.resample('D').mean().dropna()
+    uls_mean_monthly_draft = uls.resample('MS').mean().dropna()
+
+    return uls_mean_daily_draft, uls_mean_monthly_draft
+
+
+def align_uls_to_dates(uls_mean_monthly_draft, dates):
+    """ Line up monthly mean ULS ice draft with a monthly time axis, e.g. the ICESat-2 time coordinate
+
+    Args:
+        uls_mean_monthly_draft (pd.Series): monthly mean draft, e.g. from compute_uls_means
+        dates (list, pd.DatetimeIndex or xr.DataArray): dates to line up with, matched by month
+
+    Returns:
+        uls_draft_dates (pd.Series): monthly mean draft for each date (NaN where the mooring has no data)
+
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(np.asarray(dates)))
+    monthly = pd.Series(uls_mean_monthly_draft.values, index=uls_mean_monthly_draft.index.to_period('M'))
+    uls_draft_dates = monthly.reindex(dates.to_period('M'))
+    uls_draft_dates.index = dates
+
+    return uls_draft_dates
+
+
+def read_uls_means(letter, data_path='./data/', cache_path=None):
+    """ Read in a BGEP mooring and compute daily and monthly mean ULS ice draft.
+    Note the mooring location is returned as lon/lat, project it to the grid of the data being compared as needed.
+
+    Args:
+        letter (str, required): mooring letter ("a", "b" or "d")
+        data_path (str, optional): directory containing the uls18{letter}_draft.dat files (default to "./data/")
+        cache_path (str, optional): directory for the parquet cache (default to data_path)
+
+    Returns:
+        uls_mean_daily_draft (pd.Series): daily mean draft, indexed by day
+        uls_mean_monthly_draft (pd.Series): monthly mean draft, indexed by the first day of the month
+        uls_lon (float): mooring longitude
+        uls_lat (float): mooring latitude
+
+    """
+    uls = read_uls_draft(letter, data_path=data_path, cache_path=cache_path)
+    uls_mean_daily_draft, uls_mean_monthly_draft = compute_uls_means(uls)
+
+    uls_lon, uls_lat = ULS_LOCATIONS[letter]
+    print('Mooring '+letter.upper()+' ('+str(uls_lat)+' N, '+str(abs(uls_lon))+' W)')
+
+    return uls_mean_daily_draft, uls_mean_monthly_draft, uls_lon, uls_lat
@@ -3,95 +3,64 @@
 
 Helper functions for generating maps and plots 
 
+The plotting libraries (matplotlib, cartopy, holoviews, hvplot) are only imported the first time a plotting function is called. 
+For headless jobs set the environment variable IS2BOOK_HEADLESS=1 (or call set_headless()) before plotting: 
+static figures then use the non-interactive Agg backend and the holoviews/hvplot stack is never imported.
+
+Requires analysis_utils.py from the same utils package.
+
 """
 
-import xarray as xr
+import os
 import numpy as np 
 import numpy.ma as ma
 import pandas as pd
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
 from textwrap import wrap
-import hvplot.xarray
-import holoviews as hv
-import matplotlib.pyplot as plt
-from matplotlib.axes import Axes
-from cartopy.mpl.geoaxes import GeoAxes
-GeoAxes._pcolormesh_patched = Axes.pcolormesh # Helps avoid some weird issues with the polar projection 
-
-
-# -
-
-def get_winter_data(da, year_start=None, start_month="Sep", end_month="Apr", force_complete_season=False):
-    """ Select data for winter seasons corresponding to the input time range 
-    
-    Args: 
-        da (xr.Dataset or xr.DataArray): data to restrict by time; must contain "time" as a coordinate 
-        year_start (str, optional): year to start time range; if you want Sep 2019 - Apr 2020, set year="2019" (default to the first year in the dataset)
-        start_month (str, optional): first month in winter (default to September)
-        end_month (str, optional): second month in winter; this is the following calender year after start_month (default to April)
-        force_complete_season (bool, optional): require that winter season returns data if and only if all months have data? i.e. if Sep and Oct have no data, return nothing even if Nov-Apr have data? (default to False) 
-        
-    Returns: 
-        da_winter (xr.Dataset or xr.DataArray): da restricted to winter seasons 
-    
-    """
-    if year_start is None: 
-        print("No start year specified. Getting winter data for first year in the dataset")
-        year_start = str(pd.to_datetime(da.time.values[0]).year)
-    
-    start_timestep = start_month+" "+str(year_start) # mon year 
-    end_timestep = end_month+" "+str(int(year_start)+1) # mon year
-    winter = pd.date_range(start=start_timestep, end=end_timestep, freq="MS") # pandas date range defining winter season
-    months_in_da = [mon for mon in winter if mon in da.time.values] # Just grab months if they correspond to a time coordinate in da
-
-    if len(months_in_da) > 0: 
-        if (force_complete_season == True) and (all([mon in da.time.values for mon in winter])==False): 
-            da_winter = None
-        else: 
-            da_winter = da.sel(time=months_in_da)
-    else: 
-        da_winter = None
-        
-    return da_winter
+from .analysis_utils import get_winter_data, compute_gridcell_winter_means
 
+HEADLESS = os.environ.get("IS2BOOK_HEADLESS", "0") == "1"
 
-def compute_gridcell_winter_means(da, years=None, start_month="Nov", end_month="Apr", force_complete_season=False): 
-    """ Compute winter means over the time dimension. Useful for plotting as the grid is maintained. 
-    
-    Args: 
-        da (xr.Dataset or xr.DataArray): data to restrict by time; must contain "time" as a coordinate 
-        years (list of str): years over which to compute mean (default to unique years in the dataset)
-        year_start (str, optional): year to start time range; if you want Nov 2019 - Apr 2020, set year="2019" (default to the first year in the dataset)
-        start_month (str, optional): first month in winter (default to November)
-        end_month (str, optional): second month in winter; this is the following calender year after start_month (default to April)
-        force_complete_season (bool, optional): require that winter season returns data if and only if all months have data? i.e. if Sep and Oct have no data, return nothing even if Nov-Apr have data? (default to False) 
-    
-    Returns: 
-        merged (xr.DataArray): DataArray with winter means as a time coordinate
-    """
-    
-    if years is None: 
-        years = np.unique(pd.to_datetime(da.time.values).strftime("%Y")) # Unique years in the dataset 
+# Set on first use by _import_static/_import_interactive
+ccrs = None
+cfeature = None
+plt = None
+hv = None
 
-    winter_means = []
-    for year in years: # Loop through each year and grab the winter months, compute winter mean, and append to list 
-        da_winter_i = get_winter_data(da, year_start=year, start_month=start_month, end_month=end_month, force_complete_season=force_complete_season)
-        if da_winter_i is None: 
-            continue
-        da_mean_i = da_winter_i.mean(dim="time", keep_attrs=True) # Comput mean over time dimension
 
-        # Assign time coordinate 
-        time_arr = pd.to_datetime(da_winter_i.time.values)
-        da_mean_i = da_mean_i.assign_coords({"time":time_arr[0].strftime("%b %Y")+" - "+time_arr[-1].strftime("%b %Y")})
-        da_mean_i = da_mean_i.expand_dims("time")
-
-        winter_means.append(da_mean_i)
+# -
 
-    merged = xr.merge(winter_means) # Combine each winter mean Dataset into a single Dataset, with the time period maintained as a coordinate
-    merged = merged[list(merged.data_vars)[0]] # Convert to DataArray
-    merged.time.attrs["description"] = "Time period over which mean was computed" # Add descriptive attribute 
-    return merged 
+def set_headless(headless=True): 
+    """ Switch headless mode on/off. Needs to be called before the first plot as the matplotlib backend can't be changed once pyplot is imported """
+    global HEADLESS
+    HEADLESS = headless
+
+
+def _import_static(): 
+    """ Import the matplotlib/cartopy stack on first use """
+    global ccrs, cfeature, plt
+    if plt is None: 
+        import matplotlib
+        if HEADLESS: 
+            matplotlib.use("Agg")
+        import matplotlib.pyplot as plt_
+        import cartopy.crs as ccrs_
+        import cartopy.feature as cfeature_
+        from matplotlib.axes import Axes
+        from cartopy.mpl.geoaxes import GeoAxes
+        GeoAxes._pcolormesh_patched = Axes.pcolormesh # Helps avoid some weird issues with the polar projection 
+        ccrs, cfeature, plt = ccrs_, cfeature_, plt_
+
+
+def _import_interactive(): 
+    """ Import the holoviews/hvplot stack on first use """
+    global ccrs, hv
+    if HEADLESS: 
+        raise RuntimeError("Interactive plotting functions are not available in headless mode")
+    if hv is None: 
+        import cartopy.crs as ccrs_
+        import hvplot.xarray # Adds the .hvplot accessor to xarray objects
+        import holoviews as hv_
+        ccrs, hv = ccrs_, hv_
 
 
 def staticArcticMaps(da, title=None, dates=[], out_str="out", cmap="viridis", col=None, col_wrap=3, vmin=None, vmax=None, set_cbarlabel = '', min_lat=50, savefig=True): 
@@ -116,6 +85,8 @@ def staticArcticMaps(da, title=None, dates=[], out_str="out", cmap="viridis", co
         Figure displayed in notebook 
     
     """ 
+    _import_static()
+
     # Compute min and max for plotting
     def compute_vmin_vmax(da): 
         vmin = np.nanpercentile(da.values, 1)
@@ -208,6 +179,8 @@ def staticArcticMaps_overlayDrifts(da, drifts_x, drifts_y, alpha=1, vector_val=0
         Figure displayed in notebook 
     
     """ 
+    _import_static()
+
     # Make sure alpha is between 0 and 1 
     if alpha > 1: 
         print("Argument alpha must be between 0 and 1. You inputted " +str(alpha)+ ". Setting alpha to 1.")
@@ -329,6 +302,8 @@ def interactiveArcticMaps(da, clabel=None, cmap="viridis", colorbar=True, vmin=N
         pl (Holoviews map)
     
     """
+    _import_interactive()
+
     # Compute min and max for plotting
     def compute_vmin_vmax(da): 
         vmin = np.nanpercentile(da.values, 1)
@@ -395,6 +370,7 @@ def interactive_winter_mean_maps(da, years=None, end_year=None, start_month="Sep
         pl_means (Holoviews map)
     
     """
+    _import_interactive()
     
     winter_means_da = compute_gridcell_winter_means(da, years=years, start_month=start_month, end_month=end_month, force_complete_season=force_complete_season)
 
@@ -430,6 +406,8 @@ def static_winter_comparison_lineplot(da, da_unc=None, years=None, figsize=(5,3)
            Figure displayed in notebook
         
     """
+    _import_static()
+
     if years is None: 
         years = np.unique(pd.to_datetime(da.time.values).strftime("%Y")) # Unique years in the dataset 
         print("No years specified. Using "+", ".join(years))
@@ -441,7 +419,7 @@ def static_winter_comparison_lineplot(da, da_unc=None, years=None, figsize=(5,3)
         yr_end = yr+1
     else: 
         yr_end = yr
-    xaxis_months = pd.date_range(start_month+"-"+str(yr), end_month+"-"+str(yr_end), freq="M").strftime("%b")
+    xaxis_months = pd.date_range(start_month+"-"+str(yr), end_month+"-"+str(yr_end), freq="MS").strftime("%b")
     
     # Set up plot 
     fig, ax = plt.subplots(figsize=figsize)
@@ -523,6 +501,7 @@ def interactive_winter_comparison_lineplot(da, years=None, title="Winter compari
            pl (bokeh lineplot) 
         
     """
+    _import_interactive()
     
     if years is None: 
         years = np.unique(pd.to_datetime(da.time.values).strftime("%Y")) # Unique years in the dataset 
@@ -12,9 +12,18 @@ import os
 import xarray as xr 
 import pandas as pd 
 import s3fs
+import fsspec
 import glob
+import json
+import hashlib
+from collections import OrderedDict
 from datetime import datetime
 
+# In-process cache of opened datasets (most recently used last), see _cached_read
+_dataset_cache = OrderedDict()
+dataset_cache_max_bytes = 8e9 # Upper limit on the memory held by the in-process cache (persisted data and coordinates, see _in_memory_nbytes)
+dataset_cache_max_entries = 8 # Upper limit on the number of datasets in the in-process cache, lazy ones hold open files rather than memory
+
 # -
 
 def read_ISSITGR4(version='001', local_data_path="/data/ISSITGR4/"): 
@@ -61,6 +70,170 @@ def read_ISSITGR4(version='001', local_data_path="/data/ISSITGR4/"):
     
     return is_ds
 
+def _IS2SITMOGR4_file_date(file):
+    """ Parse the month from an IS2SITMOGR4 filename, e.g. IS2SITMOGR4_01_201811_006_001.nc -> 2018-11-01 """
+    return pd.to_datetime(os.path.basename(file).split("IS2SITMOGR4_01_")[1].split("_")[0], format = "%Y%m")
+
+def build_IS2SITMOGR4_reference_index(netcdf_path='s3://icesat-2-sea-ice-us-west-2/IS2SITMOGR4_V3/netcdf/', 
+                                      out_file='./data/IS2SITMOGR4/IS2SITMOGR4_V3_references.json', 
+                                      storage_options={'anon':True}): 
+    """ Scan the HDF5 chunk layout of the monthly IS2SITMOGR4 netcdf files once and write a kerchunk reference index. 
+    The index maps each variable chunk to a byte range in the original netcdf files (on S3 or in a local directory), 
+    with the monthly files concatenated along a time dimension parsed from the filenames. 
+    It can then be opened as a single lazy zarr-like dataset with read_IS2SITMOGR4(data_type='reference') without downloading the files. 
+    
+    Args: 
+        netcdf_path (str, required): S3 or local directory containing the monthly IS2SITMOGR4_01_YYYYMM_*.nc files
+        out_file (str, required): output reference index. Written as JSON, or as a parquet reference store if the path ends in .parquet
+        storage_options (dict, optional): fsspec options used to access netcdf_path (default to anonymous S3 access)
+
+    Returns: 
+        out_file (str): path to the written reference index
+    
+    """
+    from kerchunk.hdf import SingleHdf5ToZarr
+    from kerchunk.combine import MultiZarrToZarr
+
+    fs, root = fsspec.core.url_to_fs(netcdf_path, **storage_options)
+    filenames = sorted(fs.glob(root.rstrip('/')+'/*.nc'))
+    if len(filenames) == 0: 
+        raise ValueError("No files, exit")
+    # url_to_fs strips the protocol, add it back so the references point to the right place
+    filenames = [fs.unstrip_protocol(file) for file in filenames]
+
+    print('Scanning', len(filenames), 'netcdf files for chunk references')
+    single_refs = []
+    for file in filenames: 
+        print(file)
+        with fs.open(file, 'rb') as f: 
+            single_refs.append(SingleHdf5ToZarr(f, file, inline_threshold=300).translate())
+
+    # Each monthly file has no time dimension, so take time from the filename (like add_time_dim_v3 + the date parsing in read_IS2SITMOGR4)
+    protocol = fs.protocol if isinstance(fs.protocol, str) else fs.protocol[0]
+    combined = MultiZarrToZarr(single_refs, remote_protocol=protocol, 
+                               remote_options=storage_options, 
+                               concat_dims=["time"], 
+                               identical_dims=["x", "y", "latitude", "longitude"], 
+                               coo_map={"time": lambda index, fs, var, fn: _IS2SITMOGR4_file_date(filenames[index])}, 
+                               coo_dtypes={"time": "M8[ns]"})
+    refs = combined.translate()
+    # Store the protocol with the index so read_IS2SITMOGR4 knows where the files are (it can't always be inferred from the parquet store)
+    zattrs = refs["refs"][".zattrs"]
+    zattrs = json.loads(zattrs) if isinstance(zattrs, (str, bytes)) else zattrs
+    zattrs["reference_protocol"] = protocol
+    refs["refs"][".zattrs"] = json.dumps(zattrs)
+
+    out_dir = os.path.dirname(out_file)
+    if len(out_dir) > 0: 
+        os.makedirs(out_dir, exist_ok=True)
+    if out_file.endswith('.parquet'): 
+        from kerchunk.df import refs_to_dataframe
+        refs_to_dataframe(refs, out_file)
+    else: 
+        with open(out_file, 'w') as f: 
+            json.dump(refs, f)
+    print('Reference index written to', out_file)
+    
+    return out_file
+
+def _reference_protocol(reference_path):
+    """ Read the protocol stored by build_IS2SITMOGR4_reference_index from a JSON or parquet reference index """
+    if reference_path.endswith('.parquet'): 
+        with open(os.path.join(reference_path, '.zmetadata')) as f: 
+            zattrs = json.load(f)["metadata"][".zattrs"]
+    else: 
+        with open(reference_path) as f: 
+            zattrs = json.load(f)["refs"][".zattrs"]
+    zattrs = json.loads(zattrs) if isinstance(zattrs, (str, bytes)) else zattrs
+    return zattrs.get("reference_protocol", "s3")
+
+def clear_dataset_cache():
+    """ Empty the in-process dataset cache used by read_IS2SITMOGR4 and read_book_data (on-disk copies are left in place) """
+    _dataset_cache.clear()
+
+def _source_fingerprint(path, storage_options={'anon':True}):
+    """ Fingerprint a file or directory (local or S3) from the ETag or modification time and size of its contents. 
+    Returns None if the source doesn't exist yet. """
+    fs, root = fsspec.core.url_to_fs(path, **storage_options)
+    if not fs.exists(root): 
+        return None
+    if fs.isdir(root): 
+        infos = fs.ls(root, detail=True)
+    else: 
+        infos = [fs.info(root)]
+    fingerprint = [(info["name"], info.get("size"), info.get("ETag", info.get("LastModified", info.get("mtime")))) for info in infos]
+    return hashlib.sha256(json.dumps(sorted(fingerprint), default=str).encode()).hexdigest()
+
+def _in_memory_nbytes(ds, persisted):
+    """ Memory held by a cached dataset: everything if it was persisted, else just its coordinates (which the readers load into memory). 
+    Lazy data variables are only loaded into the copies returned to the user, so don't count towards the cache. """
+    if persisted: 
+        return ds.nbytes
+    return sum(ds[coord].nbytes for coord in ds.coords)
+
+def _write_local_copy(ds, disk_path, stale_prefix):
+    """ Write a consolidated zarr copy of ds to disk_path and remove older copies (starting with stale_prefix) for the same reader arguments """
+    print('Writing local copy of dataset to', disk_path)
+    # Encoding from the source files (chunks, compression) can clash with zarr, so let xarray choose
+    ds_out = ds.copy()
+    for var in ds_out.variables: 
+        ds_out[var].encoding = {}
+    # Write to a temporary path first so an interrupted write isn't picked up as a valid copy
+    fs = fsspec.filesystem("file")
+    if fs.exists(disk_path+'.tmp'): 
+        fs.rm(disk_path+'.tmp', recursive=True)
+    ds_out.to_zarr(disk_path+'.tmp', mode='w', consolidated=True)
+    os.rename(disk_path+'.tmp', disk_path)
+    for old_path in glob.glob(stale_prefix+'*.zarr'): 
+        if old_path != disk_path: 
+            print('Removing out of date local copy', old_path)
+            fs.rm(old_path, recursive=True)
+
+def _cached_read(reader_name, reader_args, source_path, open_func, persist=False, cache=True, cache_dir=None): 
+    """ Return a dataset from the in-process cache, else from a local zarr copy in cache_dir, else open it with open_func and cache it. 
+    Entries are keyed by the reader arguments and a fingerprint of the source data, so a change to the source data is picked up 
+    (replacing the entry and local copy for the old data). 
+    A shallow copy is returned each time so adding/reassigning variables doesn't change the cached dataset. 
+    """
+    fingerprint = _source_fingerprint(source_path)
+    args_key = hashlib.sha256(json.dumps([reader_name, reader_args], sort_keys=True, default=str).encode()).hexdigest()[:16]
+    key = args_key+'_'+str(fingerprint)[:16]
+    if cache_dir is not None: 
+        disk_path = os.path.join(cache_dir, reader_name+'_'+key+'.zarr')
+
+    ds = None
+    if cache and (key in _dataset_cache): 
+        print('Using dataset cached in memory')
+        _dataset_cache.move_to_end(key)
+        ds = _dataset_cache[key][0]
+    elif (cache_dir is not None) and os.path.exists(disk_path): 
+        print('Using dataset cached on disk:', disk_path)
+        ds = xr.open_zarr(disk_path, consolidated=True)
+        # Had a problem with these being loaded as dask arrays which cartopy doesnt like
+        ds = ds.assign_coords({coord: ds[coord].load() for coord in ["longitude", "latitude"] if coord in ds.coords})
+        if persist==True:
+            ds = ds.persist()
+
+    if ds is None: 
+        ds = open_func()
+
+    # Also done on a memory hit, as an earlier call may not have asked for a local copy
+    if (cache_dir is not None) and (fingerprint is not None) and not os.path.exists(disk_path): 
+        _write_local_copy(ds, disk_path, os.path.join(cache_dir, reader_name+'_'+args_key+'_'))
+
+    # Don't hold on to datasets we can't fingerprint (e.g. a source which is yet to be downloaded)
+    if cache and (fingerprint is not None) and (key not in _dataset_cache): 
+        # Drop the entry for the old version of the source data, if it has changed
+        for old_key in [old_key for old_key in _dataset_cache if old_key.startswith(args_key)]: 
+            del _dataset_cache[old_key]
+        _dataset_cache[key] = (ds, persist)
+        # Drop least recently used (dropped datasets are closed once any copies returned to the user are also gone)
+        while (len(_dataset_cache) > 1) and ((len(_dataset_cache) > dataset_cache_max_entries) or 
+                                             (sum(_in_memory_nbytes(ds_i, persisted) for ds_i, persisted in _dataset_cache.values()) > dataset_cache_max_bytes)): 
+            _dataset_cache.popitem(last=False)
+    
+    return ds.copy()
+
 def add_time_dim_v2(xda):
     """ dummy function to just set current time as a new dimension to concat files over, change later! """
     xda = xda.set_coords(["latitude","longitude", "xgrid", "ygrid"])
@@ -76,23 +249,34 @@ def add_time_dim_v3(xda):
 def read_IS2SITMOGR4(data_type='zarr-s3', version='V3', local_data_path="./data/IS2SITMOGR4/", 
                      zarr_path='s3://icesat-2-sea-ice-us-west-2/IS2SITMOGR4_V3/IS2SITMOGR4_V3_201811-202404.zarr',
                      netcdf_s3_path='s3://icesat-2-sea-ice-us-west-2/IS2SITMOGR4_V3/netcdf/', 
-                     persist=True): 
+                     reference_path='./data/IS2SITMOGR4/IS2SITMOGR4_V3_references.json', storage_options={'anon':True}, 
+                     persist=True, cache=True, cache_dir=None): 
     """ Read in IS2SITMOGR4 monthly gridded thickness dataset from local netcdf files, 
     download the netcdf files from S3 storage, or read in the aggregated zarr dataset from S3. 
     Currently supports either Version 2 (V2) or Version 3 (V3) data. 
     
     Args: 
-        data_type (str, required): (default to "zarr-s3", but also "netcdf-s3" or "netcdf-local" which is a local version of the netcdf files)
+        data_type (str, required): (default to "zarr-s3", but also "netcdf-s3", "netcdf-local" which is a local version of the netcdf files, or "reference" which reads the netcdf files in place through a reference index)
         version (str, required): dataset version, the default is V3 but V2 has some little changes we need to adapt for.
         local_data_path (str, required): local data directory
         zarr_path (str): path to zarr file
         netcdf_s3_path (str): path to netcdf files stored on s3
+        reference_path (str): path to the reference index generated by build_IS2SITMOGR4_reference_index (JSON or .parquet)
+        storage_options (dict): fsspec options for reading the netcdf files referenced by the index, should match those used to build it (default to anonymous S3 access)
         persist (boleen): if zarr option decide if you want to persist (load) data into memory
+        cache (boleen): reuse the dataset already opened in this session by a call with the same arguments, if the source data hasn't changed
+        cache_dir (str, optional): directory for a local zarr copy of the dataset, so a new session can start from disk (default to no local copy)
 
     Returns: 
         is2_ds (xr.Dataset): aggregated IS2SITMOGR4 xarray dataset, dask chunked/virtually allocated in the case of the zarr option (or allocated to memory if persisted). 
         
     Version History: 
+        October 2026
+            - Added an in-process cache of opened datasets (and an optional local zarr copy) so repeated calls don't reopen, 
+              re-download or re-persist the data.
+            - Added the "reference" option which opens the netcdf files in place (S3 or local) through a kerchunk reference index, 
+              so we don't need to download them or open each file's metadata every time.
+
         February 2025
             - hard-coded the datapaths as mostly just V3 at this point and the V2/V3 stuff was getting confusing
             - now you just provide the path to the zarr or netcdf files as desired which I think is easier. 
@@ -104,6 +288,14 @@ def read_IS2SITMOGR4(data_type='zarr-s3', version='V3', local_data_path="./data/
             - Adapted the netcdf reader to use open_mfdataset, required a preprocessing data dimension step. Much more elegant!
             Note than in Version 3 there was a change in the xgrid/ygrid coordinates to x/y.
     """
+
+    if cache or (cache_dir is not None): 
+        source_paths = {'zarr-s3':zarr_path, 'reference':reference_path, 'netcdf-s3':netcdf_s3_path}
+        reader_args = dict(data_type=data_type, version=version, local_data_path=local_data_path, zarr_path=zarr_path, 
+                           netcdf_s3_path=netcdf_s3_path, reference_path=reference_path, storage_options=storage_options, persist=persist)
+        return _cached_read('IS2SITMOGR4', reader_args, source_paths.get(data_type, local_data_path+version+'/'), 
+                            lambda: read_IS2SITMOGR4(cache=False, cache_dir=None, **reader_args), 
+                            persist=persist and (data_type in ['zarr-s3', 'reference']), cache=cache, cache_dir=cache_dir)
             
     if data_type=='zarr-s3':
 
@@ -123,6 +315,29 @@ def read_IS2SITMOGR4(data_type='zarr-s3', version='V3', local_data_path="./data/
         
         return is2_ds
 
+    if data_type=='reference':
+
+        print('load netcdf files through reference index')
+
+        print('reference_path:', reference_path)
+        if not os.path.exists(reference_path): 
+            raise ValueError("No reference index found, generate it first with build_IS2SITMOGR4_reference_index")
+        fs = fsspec.filesystem("reference", fo=reference_path, remote_protocol=_reference_protocol(reference_path), remote_options=storage_options)
+        is2_ds = xr.open_dataset(fs.get_mapper(""), engine="zarr", backend_kwargs={"consolidated":False}, chunks={})
+        is2_ds.attrs.pop("reference_protocol", None)
+        is2_ds = is2_ds.sortby("time")
+        is2_ds = is2_ds.set_coords(["latitude","longitude","x","y"])
+        # Had a problem with these being loaded as dask arrays which cartopy doesnt like
+        is2_ds = is2_ds.assign_coords(longitude=(["y","x"], is2_ds.longitude.values))
+        is2_ds = is2_ds.assign_coords(latitude=(["y","x"], is2_ds.latitude.values))
+        
+        is2_ds = is2_ds.assign_attrs(description="Aggregated IS2SITMOGR4 "+version+" dataset.")
+
+        if persist==True:
+            is2_ds = is2_ds.persist()
+        
+        return is2_ds
+
     if data_type=='netcdf-s3':
         # Download data from S3 to local bucket
         print("download from S3 bucket: ", netcdf_s3_path)
@@ -142,7 +357,7 @@ def read_IS2SITMOGR4(data_type='zarr-s3', version='V3', local_data_path="./data/
         raise ValueError("No files, exit")
         return None
     
-    dates = [pd.to_datetime(file.split("IS2SITMOGR4_01_")[1].split("_")[0], format = "%Y%m")  for file in filenames]
+    dates = [_IS2SITMOGR4_file_date(file) for file in filenames]
     # Add a dummy time then add the dates I want, seemed the easiest solution
     if version=='V2':
         is2_ds = xr.open_mfdataset(filenames, preprocess = add_time_dim_v2, engine='netcdf4')
@@ -167,7 +382,7 @@ def read_IS2SITMOGR4(data_type='zarr-s3', version='V3', local_data_path="./data/
     return is2_ds
 
 
-def read_book_data(local_path='/data/', CS2=False): 
+def read_book_data(local_path='/data/', CS2=False, cache=True, cache_dir=None): 
     """ Read in data for ICESat2 jupyter book. 
     If the file does not already exist on the user's local drive, it is downloaded from our S3 bucket
     The netcdf file is then read in as an xr.Dataset object 
@@ -178,6 +393,8 @@ def read_book_data(local_path='/data/', CS2=False):
     Args: 
         local_path (str, required): local data directory
         CS2 (boleen, required): choose if we want to also read in the wrangled CS-2 thickness data
+        cache (boleen): reuse the dataset already opened in this session by a call with the same arguments, if the file hasn't changed
+        cache_dir (str, optional): directory for a local zarr copy of the dataset, so a new session can start from disk (default to no local copy)
     Returns: 
         book_ds (xr.Dataset): data 
     
@@ -188,8 +405,14 @@ def read_book_data(local_path='/data/', CS2=False):
     else:
         filename = "IS2_jbook_dataset_201811-202104.nc"
     
-    # Check if file exists on local drive
     current_path = os.getcwd()
+
+    if cache or (cache_dir is not None): 
+        return _cached_read('book_data', dict(local_path=local_path, CS2=CS2), current_path+local_path+filename, 
+                            lambda: read_book_data(local_path=local_path, CS2=CS2, cache=False, cache_dir=None), 
+                            cache=cache, cache_dir=cache_dir)
+
+    # Check if file exists on local drive
     exists_locally = os.path.isfile(current_path+local_path+filename) 
     
     if (exists_locally == False): 
@@ -197,7 +420,7 @@ def read_book_data(local_path='/data/', CS2=False):
         print("Downloading jupyter book data from the S3 bucket...")
         s3_path = 's3://icesat-2-sea-ice-us-west-2/book_data/'+filename
         fs = s3fs.S3FileSystem(anon=True)
-        fs.download(file, current_path+local_data_path)
+        fs.download(s3_path, current_path+local_path+filename)
 
     book_ds = xr.open_dataset(current_path+local_path+filename)
     return book_ds
@@ -0,0 +1,165 @@
+# +
+""" render_utils.py
+
+Helper functions for regenerating the book figures in batch.
+Figures are rendered in parallel (headless) worker processes and skipped if their input data and options haven't changed since the last render.
+
+"""
+
+import os
+import time
+import json
+import hashlib
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+
+# -
+
+def _select_data(ds, variable, period=None):
+    """ Select a variable over a time period, e.g. period=("Nov 2019", "Apr 2020"), period="Nov 2019" or period=None for all times """
+    da = ds[variable]
+    if period is None:
+        return da
+    if isinstance(period, (list, tuple)):
+        return da.sel(time=slice(period[0], period[1]))
+    return da.sel(time=period)
+
+
+def _hash_array(h, arr):
+    """ Add an array's shape and values to the hash. Object/string arrays (e.g. winter mean time labels) are hashed by value, not by their object pointers """
+    arr = np.asarray(arr)
+    h.update(str(arr.shape).encode())
+    if arr.dtype.kind in "OSU":
+        h.update(pd.util.hash_array(arr.ravel().astype(object)).tobytes())
+    else:
+        h.update(np.ascontiguousarray(arr).tobytes())
+
+
+def _figure_hash(spec, data):
+    """ Hash the figure specification along with the values, coordinates and attributes of its input data """
+    h = hashlib.sha256()
+    h.update(json.dumps({key:spec.get(key) for key in ["function", "variable", "period", "options", "data_args", "format", "dpi"]},
+                        sort_keys=True, default=str).encode())
+    for arg in sorted(data):
+        da = data[arg]
+        h.update(arg.encode())
+        _hash_array(h, da.values)
+        for coord in sorted(da.coords):
+            h.update(coord.encode())
+            _hash_array(h, da[coord].values)
+        h.update(json.dumps(da.attrs, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _write_manifest(manifest, manifest_path):
+    """ Save the render manifest as JSON """
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def _init_worker():
+    """ Render in headless mode (Agg backend, no interactive stack) """
+    from . import plotting_utils
+    plotting_utils.set_headless(True)
+
+
+def _render_figure(spec, data, out_file):
+    """ Render one figure in a worker process and save it to out_file. Returns the render time in seconds. """
+    from . import plotting_utils
+    plotting_utils._import_static()
+    plt = plotting_utils.plt
+
+    start = time.time()
+    plot_func = getattr(plotting_utils, spec["function"])
+    options = dict(spec.get("options", {}))
+    options["savefig"] = False # We save the figure here rather than in ./figs/
+    da = data.pop("da")
+    fig = plot_func(da, **data, **options)
+    if fig is None: # e.g. static_winter_comparison_lineplot shows rather than returns the figure
+        fig = plt.gcf()
+    fig.savefig(out_file, dpi=spec.get("dpi", 300), facecolor="white", bbox_inches='tight')
+    plt.close("all")
+    return time.time() - start
+
+
+def render_figures(ds, specs, out_dir="./figs/", max_workers=None, manifest_file="render_manifest.json", force=False):
+    """ Render a batch of static figures in parallel, skipping figures whose inputs are unchanged since the last render.
+    Each output is keyed on a hash of the input data slice and the figure options, stored in a manifest in out_dir along with the render times.
+    The workers are started with "spawn", which re-imports the calling script, so in a batch script call this from under an 
+    if __name__ == "__main__": guard (otherwise each worker re-runs the script).
+
+    Example spec (monthly maps, one panel per month from Nov 2023 to Apr 2024):
+        {"name": "maps_thickness_monthly_2023", "function": "staticArcticMaps", "variable": "ice_thickness_int",
+         "period": ("Nov 2023", "Apr 2024"), "options": {"vmin": 0, "vmax": 4, "col_wrap": 3}}
+    Winter mean maps need a ds of winter means, e.g. compute_gridcell_winter_means(ds.ice_thickness_int).to_dataset(), 
+    with period set to None (all winters) or a winter label such as "Nov 2023 - Apr 2024".
+
+    Args:
+        ds (xr.Dataset): dataset containing the variables to plot; must contain "time" as a coordinate if a period is given
+        specs (list of dict): figure specifications with keys
+            name (str, required): output filename (without extension)
+            function (str, required): plotting_utils function (staticArcticMaps, staticArcticMaps_overlayDrifts or static_winter_comparison_lineplot)
+            variable (str, required): variable to plot
+            period (str or tuple, optional): time or (start, end) time range to select (default to all times)
+            options (dict, optional): keyword arguments passed to the plotting function
+            data_args (dict, optional): other DataArray arguments of the plotting function and the variable to use, e.g. {"drifts_x": "drift_x", "drifts_y": "drift_y"}
+            format (str, optional): output file format (default to "png")
+            dpi (int, optional): output resolution (default to 300)
+        out_dir (str, optional): output directory (default to "./figs/")
+        max_workers (int, optional): number of worker processes (default to the number of CPUs)
+        manifest_file (str, optional): manifest filename in out_dir (default to "render_manifest.json")
+        force (bool, optional): render every figure even if it is unchanged (default to False)
+
+    Returns:
+        manifest (dict): hash, output file and render time for each figure name
+
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, manifest_file)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    else:
+        manifest = {}
+
+    # Select (and load) the data in this process so it can be hashed and sent to the workers
+    jobs = []
+    for spec in specs:
+        data = {"da": _select_data(ds, spec["variable"], spec.get("period")).load()}
+        for arg, variable in spec.get("data_args", {}).items():
+            data[arg] = _select_data(ds, variable, spec.get("period")).load()
+        fig_hash = _figure_hash(spec, data)
+        out_file = os.path.join(out_dir, spec["name"]+"."+spec.get("format", "png"))
+
+        previous = manifest.get(spec["name"], {})
+        if (not force) and (previous.get("hash") == fig_hash) and os.path.isfile(out_file):
+            print("Unchanged, skipping:", out_file)
+            previous["status"] = "skipped"
+            continue
+        jobs.append((spec, data, out_file, fig_hash))
+
+    print("Rendering", len(jobs), "of", len(specs), "figures")
+    if len(jobs) == 0:
+        _write_manifest(manifest, manifest_path)
+        return manifest
+
+    # Use fresh (spawned) processes so the workers don't inherit a notebook matplotlib backend or open dask/S3 connections
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker) as executor:
+        futures = {executor.submit(_render_figure, spec, data, out_file): (spec, out_file, fig_hash) for spec, data, out_file, fig_hash in jobs}
+        for future, (spec, out_file, fig_hash) in futures.items():
+            try:
+                render_time = future.result()
+            except Exception as e: # Keep going so one bad figure doesn't stop the batch, it will be retried next time as no hash is stored
+                print("Failed to render", out_file, ":", e)
+                manifest[spec["name"]] = {"file": out_file, "function": spec["function"], "status": "failed", "error": str(e)}
+                continue
+            print("Rendered", out_file, "in", "%.1f" %render_time, "s")
+            manifest[spec["name"]] = {"hash": fig_hash, "file": out_file, "function": spec["function"],
+                                      "render_time_s": render_time, "rendered": pd.Timestamp.now().isoformat(), "status": "rendered"}
+
+    _write_manifest(manifest, manifest_path)
+
+    return manifest